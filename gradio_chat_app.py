@@ -1,5 +1,5 @@
 import gradio as gr
-from stream_chat_app import StreamChatApp, ChatSession
+from stream_chat_app import StreamChatApp, ChatSession, setup_logging
 import logging
 from typing import List, Tuple
 
@@ -11,6 +11,30 @@ class GradioChatApp(StreamChatApp):
         self.chat_history: List[Tuple[str, str]] = []
         self.current_session = ChatSession(self.SYSTEM_PROMPT)
     
+    def sync_session(self, history: List[Tuple[str, str]], system_prompt: str):
+        """确保当前会话与界面上的提示词和历史一致"""
+        # 系统提示词是对话树的根节点，节点不可变且指向父节点，
+        # 换根必须重建整条分支；历史不一致时同样以界面历史为准
+        if (system_prompt != self.SYSTEM_PROMPT
+                or not self.session_matches(history)):
+            self.SYSTEM_PROMPT = system_prompt
+            self.current_session = ChatSession(self.SYSTEM_PROMPT)
+            # 重新添加历史消息
+            for user_msg, bot_msg in history:
+                self.current_session.add_message('user', user_msg)
+                self.current_session.add_message('assistant', bot_msg)
+    
+    def session_matches(self, history: List[Tuple[str, str]]) -> bool:
+        """检查当前会话的长度和最后一轮对话是否与界面历史一致"""
+        head = self.current_session.head
+        if head.depth != 2 * len(history):
+            return False
+        if not history:
+            return True
+        user_msg, bot_msg = history[-1]
+        return (head.role == 'assistant' and head.content == bot_msg
+                and head.parent.content == user_msg)
+    
     def chat_response(
         self, 
         message: str, 
@@ -18,28 +42,14 @@ class GradioChatApp(StreamChatApp):
         system_prompt: str
     ) -> Tuple[str, List[Tuple[str, str]]]:
         """处理聊天消息并返回响应"""
+        self.sync_session(history, system_prompt)
+        previous = self.current_session.head
         try:
-            # 如果系统提示词改变，更新它
-            if system_prompt != self.SYSTEM_PROMPT:
-                self.SYSTEM_PROMPT = system_prompt
-                self.current_session = ChatSession(self.SYSTEM_PROMPT)
-                # 重新添加历史消息
-                for user_msg, bot_msg in history:
-                    self.current_session.add_message('user', user_msg)
-                    self.current_session.add_message('assistant', bot_msg)
-            
             # 添加用户消息
             self.current_session.add_message('user', message)
             
             # 获取AI响应
-            messages = self.current_session.get_messages()
-            completion = self.client.chat.completions.create(
-                model="qwen-plus",
-                messages=messages,
-                stream=False  # Gradio不需要流式响应
-            )
-            
-            response = completion.choices[0].message.content
+            response = self.get_completion()
             
             # 添加助手消息
             self.current_session.add_message('assistant', response)
@@ -52,8 +62,44 @@ class GradioChatApp(StreamChatApp):
             
         except Exception as e:
             logger.error(f"处理消息时出错: {str(e)}", exc_info=True)
+            # 回到发送前的节点，避免留下没有回复的用户消息
+            self.current_session.checkout(previous)
+            gr.Warning(f"发送失败: {str(e)}")
             return "", history  # 发生错误时也返回空字符串
     
+    def get_completion(self) -> str:
+        """根据当前会话获取AI响应"""
+        messages = self.current_session.get_messages()
+        completion = self.client.chat.completions.create(
+            model="qwen-plus",
+            messages=messages,
+            stream=False  # Gradio不需要流式响应
+        )
+        return completion.choices[0].message.content
+    
+    def regenerate_response(
+        self, 
+        history: List[Tuple[str, str]], 
+        system_prompt: str
+    ) -> List[Tuple[str, str]]:
+        """重新生成最后一条回复"""
+        if not history:
+            return history
+        
+        self.sync_session(history, system_prompt)
+        # 回到上一条助手消息的父节点，旧回复仍保留在对话树中
+        previous = self.current_session.head
+        try:
+            self.current_session.regenerate()
+            response = self.get_completion()
+            self.current_session.add_message('assistant', response)
+            return history[:-1] + [(history[-1][0], response)]
+        except Exception as e:
+            logger.error(f"重新生成回复时出错: {str(e)}", exc_info=True)
+            self.current_session.checkout(previous)
+            gr.Warning(f"重新生成失败: {str(e)}")
+            return history
+    
     def clear_history(self) -> Tuple[str, List[Tuple[str, str]], str]:
         """清除聊天历史"""
         self.current_session = ChatSession(self.SYSTEM_PROMPT)
@@ -84,6 +130,7 @@ class GradioChatApp(StreamChatApp):
                     
                     with gr.Row():
                         submit = gr.Button("发送")
+                        regenerate = gr.Button("重新生成")
                         clear = gr.Button("清除历史")
             
             # 处理发送消息
@@ -100,6 +147,13 @@ class GradioChatApp(StreamChatApp):
                 outputs=[msg, chatbot]
             )
             
+            # 处理重新生成
+            regenerate.click(
+                fn=self.regenerate_response,
+                inputs=[chatbot, system_prompt],
+                outputs=[chatbot]
+            )
+            
             # 处理清除历史
             clear.click(
                 fn=self.clear_history,
@@ -110,6 +164,7 @@ class GradioChatApp(StreamChatApp):
         return demo
 
 def main():
+    setup_logging()
     app = GradioChatApp()
     demo = app.create_ui()
     demo.launch(
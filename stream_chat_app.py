@@ -5,59 +5,139 @@ from dotenv import load_dotenv
 import json
 from datetime import timedelta, datetime
 import logging
-from dataclasses import dataclass
-from typing import List, Dict
+from typing import List, Dict, Optional
+import copy
 import sys
 import codecs
 from threading import Lock
 
-# 设置标准输出和错误输出的编码
-sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer)
-sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer)
-
-# 配置日志
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('stream_chat.log', encoding='utf-8'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
 logger = logging.getLogger(__name__)
 
+def setup_logging():
+    """设置输出编码并配置日志，在启动应用时调用"""
+    # 设置标准输出和错误输出的编码
+    sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer)
+    sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer)
+    
+    # 配置日志
+    logging.basicConfig(
+        level=logging.DEBUG,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('stream_chat.log', encoding='utf-8'),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+
 # 加载环境变量
 load_dotenv()
 
-@dataclass
 class ChatMessage:
-    role: str
-    content: str
+    """不可变的消息节点，通过 parent 链接成对话树，共享公共前缀
+    
+    同一条分支上的节点共用一个节点列表：第一个子节点直接追加到父节点的列表中，
+    兄弟节点在首次需要时才复制父节点的前缀，每个节点只记录自己的前缀长度。
+    """
+    __slots__ = ('role', 'content', 'parent', 'depth', '_path')
+    
+    def __init__(self, role: str, content: str, parent: Optional['ChatMessage'] = None):
+        object.__setattr__(self, 'role', role)
+        object.__setattr__(self, 'content', content)
+        object.__setattr__(self, 'parent', parent)
+        object.__setattr__(self, 'depth', 0 if parent is None else parent.depth + 1)
+        path = None
+        if parent is None:
+            path = [self]
+        elif parent._path is not None and len(parent._path) == parent.depth + 1:
+            # 父节点位于共享列表末尾，直接追加
+            path = parent._path
+            path.append(self)
+        object.__setattr__(self, '_path', path)
+    
+    def __setattr__(self, name, value):
+        raise AttributeError('ChatMessage 是不可变的')
+    
+    def __delattr__(self, name):
+        raise AttributeError('ChatMessage 是不可变的')
+    
+    def __reduce__(self):
+        # 按分支逐个重建节点，避免长链递归序列化
+        return (_build_branch, ([(node.role, node.content) for node in self.path()],))
+    
+    def __repr__(self) -> str:
+        return f"ChatMessage(role={self.role!r}, content={self.content!r})"
+    
+    def path(self) -> List['ChatMessage']:
+        """获取从根节点到当前节点的消息节点"""
+        if self._path is None:
+            # 找到最近一个已有共享列表的祖先，复制其前缀后补齐新节点
+            pending = []
+            node = self
+            while node._path is None:
+                pending.append(node)
+                node = node.parent
+            path = node._path[:node.depth + 1]
+            for item in reversed(pending):
+                path.append(item)
+                object.__setattr__(item, '_path', path)
+        return self._path[:self.depth + 1]
+
+def _build_branch(items: List[tuple]) -> ChatMessage:
+    """根据 (role, content) 列表重建一条分支，返回末端节点"""
+    node = None
+    for role, content in items:
+        node = ChatMessage(role=role, content=content, parent=node)
+    return node
 
 class ChatSession:
     def __init__(self, system_prompt: str):
         self.system_prompt = system_prompt
-        self.messages: List[ChatMessage] = []
+        self.head: Optional[ChatMessage] = None
         self.initialize()
     
     def initialize(self):
         """初始化会话"""
-        self.messages = [ChatMessage(role='system', content=self.system_prompt)]
+        self.head = ChatMessage(role='system', content=self.system_prompt)
+    
+    @property
+    def messages(self) -> List[ChatMessage]:
+        """当前分支上从根到 head 的消息节点（每次返回新列表，修改它不会影响会话）"""
+        return self.head.path()
     
-    def add_message(self, role: str, content: str):
+    def add_message(self, role: str, content: str) -> ChatMessage:
         """添加新消息"""
-        self.messages.append(ChatMessage(role=role, content=content))
+        self.head = ChatMessage(role=role, content=content, parent=self.head)
+        return self.head
+    
+    def checkout(self, node: ChatMessage):
+        """切换到对话树中的任意节点"""
+        self.head = node
+    
+    def fork(self) -> 'ChatSession':
+        """分叉会话，新会话与当前会话共享已有的消息"""
+        return copy.copy(self)
+    
+    def regenerate(self) -> ChatMessage:
+        """撤回最后一条助手消息，以便重新生成回复"""
+        if self.head.role != 'assistant':
+            raise ValueError('最后一条消息不是助手回复，无法重新生成')
+        self.head = self.head.parent
+        return self.head
+    
+    def edit_message(self, node: ChatMessage, content: str) -> ChatMessage:
+        """编辑历史消息：在原消息的父节点下创建新分支，并切换到该分支"""
+        if node.parent is None:
+            raise ValueError('不能编辑系统消息')
+        self.head = ChatMessage(role=node.role, content=content, parent=node.parent)
+        return self.head
     
     def get_messages(self) -> List[dict]:
         """获取用于API的消息格式"""
-        return [{'role': msg.role, 'content': msg.content} for msg in self.messages]
+        return [{'role': msg.role, 'content': msg.content} for msg in self.head.path()]
     
     def to_dict(self) -> dict:
         """转换为可序列化的字典"""
-        return {
-            'messages': [{'role': msg.role, 'content': msg.content} 
-                        for msg in self.messages]
-        }
+        return {'messages': self.get_messages()}
 
 class StreamChatApp:
     def __init__(self):
@@ -125,7 +205,7 @@ class StreamChatApp:
             
             # 清理临时存储
             del self.pending_responses[response_id]
-            logger.debug(f"已保存响应到会话，当前消息数: {len(chat_session.messages)}")
+            logger.debug(f"已保存响应到会话，当前消息数: {chat_session.head.depth + 1}")
     
     def home(self):
         """主页路由"""
@@ -228,6 +308,7 @@ class StreamChatApp:
     
     def run(self):
         """运行应用"""
+        setup_logging()
         self.app.run(debug=True, port=5001)  # 使用不同的端口
 
 if __name__ == '__main__':
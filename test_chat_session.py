@@ -0,0 +1,111 @@
+import copy
+import pickle
+
+import pytest
+
+from stream_chat_app import ChatSession
+
+
+def make_session():
+    chat_session = ChatSession('sys')
+    chat_session.add_message('user', 'a')
+    chat_session.add_message('assistant', 'b')
+    return chat_session
+
+
+def contents(chat_session):
+    return [msg['content'] for msg in chat_session.get_messages()]
+
+
+def test_edit_creates_sibling_branch():
+    chat_session = make_session()
+    old_head = chat_session.head
+    user_node = chat_session.messages[1]
+
+    new_node = chat_session.edit_message(user_node, 'a2')
+
+    assert new_node.parent is user_node.parent
+    assert contents(chat_session) == ['sys', 'a2']
+    chat_session.checkout(old_head)
+    assert contents(chat_session) == ['sys', 'a', 'b']
+
+
+def test_fork_shares_prefix_and_diverges():
+    chat_session = make_session()
+    forked = chat_session.fork()
+
+    forked.add_message('user', 'c')
+    chat_session.add_message('user', 'd')
+
+    assert contents(forked) == ['sys', 'a', 'b', 'c']
+    assert contents(chat_session) == ['sys', 'a', 'b', 'd']
+    assert forked.head.parent is chat_session.head.parent
+    assert forked.system_prompt == chat_session.system_prompt
+
+
+def test_regenerate_requires_assistant_head():
+    chat_session = make_session()
+    chat_session.regenerate()
+    assert chat_session.head.role == 'user'
+
+    with pytest.raises(ValueError):
+        chat_session.regenerate()
+
+
+def test_checkout_switches_branch():
+    chat_session = make_session()
+    first_reply = chat_session.head
+    chat_session.regenerate()
+    chat_session.add_message('assistant', 'b2')
+
+    assert contents(chat_session) == ['sys', 'a', 'b2']
+    chat_session.checkout(first_reply)
+    assert contents(chat_session) == ['sys', 'a', 'b']
+
+
+def test_get_messages_returns_copies():
+    chat_session = make_session()
+    forked = chat_session.fork()
+
+    chat_session.get_messages()[1]['content'] = 'X'
+
+    assert contents(chat_session) == ['sys', 'a', 'b']
+    assert contents(forked) == ['sys', 'a', 'b']
+    with pytest.raises(AttributeError):
+        chat_session.head.content = 'X'
+
+
+def test_branch_shares_node_path():
+    chat_session = make_session()
+    nodes = chat_session.messages
+    chat_session.add_message('user', 'c')
+
+    # 同一分支上的节点共用一个列表，只追加新节点
+    assert all(node._path is chat_session.head._path for node in nodes)
+    assert chat_session.head.parent.path() == nodes
+
+    chat_session.checkout(nodes[-1])
+    sibling = chat_session.add_message('user', 'd')
+    assert contents(chat_session) == ['sys', 'a', 'b', 'd']
+    assert sibling._path is not nodes[0]._path
+    assert contents(chat_session.fork()) == ['sys', 'a', 'b', 'd']
+    assert [node.content for node in nodes[-1].path()] == ['sys', 'a', 'b']
+
+
+def test_nodes_are_immutable():
+    chat_session = make_session()
+    with pytest.raises(AttributeError):
+        del chat_session.head.content
+    assert chat_session.head.content == 'b'
+
+
+def test_pickle_long_branch():
+    chat_session = ChatSession('sys')
+    for i in range(5000):
+        chat_session.add_message('user', str(i))
+
+    restored = pickle.loads(pickle.dumps(chat_session))
+    copied = copy.deepcopy(chat_session)
+
+    assert restored.get_messages() == chat_session.get_messages()
+    assert copied.get_messages() == chat_session.get_messages()
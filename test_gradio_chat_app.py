@@ -0,0 +1,93 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+pytest.importorskip('gradio')
+
+from gradio_chat_app import GradioChatApp
+
+
+def completion(content):
+    result = MagicMock()
+    result.choices[0].message.content = content
+    return result
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setenv('DASHSCOPE_API_KEY', 'test')
+    chat_app = GradioChatApp()
+    chat_app.client = MagicMock()
+    return chat_app
+
+
+def sent_messages(app):
+    return app.client.chat.completions.create.call_args.kwargs['messages']
+
+
+def test_chat_response_appends_pair(app):
+    app.client.chat.completions.create.return_value = completion('b')
+
+    text, history = app.chat_response('a', [], app.SYSTEM_PROMPT)
+
+    assert text == ''
+    assert history == [('a', 'b')]
+    assert [msg['content'] for msg in app.current_session.get_messages()[1:]] == ['a', 'b']
+
+
+def test_failed_send_rolls_back(app):
+    history = [('a', 'b')]
+    app.sync_session(history, app.SYSTEM_PROMPT)
+    previous = app.current_session.head
+    app.client.chat.completions.create.side_effect = RuntimeError('boom')
+
+    _, new_history = app.chat_response('c', history, app.SYSTEM_PROMPT)
+
+    assert new_history == history
+    assert app.current_session.head is previous
+
+
+def test_regenerate_replaces_last_pair(app):
+    history = [('a', 'b'), ('c', 'd')]
+    app.client.chat.completions.create.return_value = completion('d2')
+
+    new_history = app.regenerate_response(history, 'new prompt')
+
+    assert new_history == [('a', 'b'), ('c', 'd2')]
+    assert sent_messages(app) == [
+        {'role': 'system', 'content': 'new prompt'},
+        {'role': 'user', 'content': 'a'},
+        {'role': 'assistant', 'content': 'b'},
+        {'role': 'user', 'content': 'c'},
+    ]
+
+
+def test_failed_regenerate_rolls_back(app):
+    history = [('a', 'b')]
+    app.sync_session(history, app.SYSTEM_PROMPT)
+    previous = app.current_session.head
+    app.client.chat.completions.create.side_effect = RuntimeError('boom')
+
+    assert app.regenerate_response(history, app.SYSTEM_PROMPT) == history
+    assert app.current_session.head is previous
+
+
+def test_sync_session_rebuilds_on_different_history(app):
+    app.sync_session([('a', 'b')], app.SYSTEM_PROMPT)
+    app.client.chat.completions.create.return_value = completion('y2')
+
+    # 长度相同但内容不同的历史（例如另一个浏览器标签页）会触发重建
+    new_history = app.regenerate_response([('x', 'y')], app.SYSTEM_PROMPT)
+
+    assert new_history == [('x', 'y2')]
+    assert sent_messages(app)[1:] == [{'role': 'user', 'content': 'x'}]
+
+
+def test_sync_session_keeps_matching_session(app):
+    history = [('a', 'b')]
+    app.sync_session(history, app.SYSTEM_PROMPT)
+    head = app.current_session.head
+
+    app.sync_session(history, app.SYSTEM_PROMPT)
+
+    assert app.current_session.head is head